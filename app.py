@@ -8,11 +8,24 @@ import json
 from fpdf import FPDF # Für PDF-Export
 import io # Für Bild-Bytes im PDF-Export
 import os # Für das Verwalten von Projektdateien
+import tempfile # Für atomares Speichern von Projektdateien
+import zipfile # Projektcontainer (Metadaten + Array-Daten)
 
 # --- Standardwerte und Annahmen ---
 # (Die meisten Konstanten bleiben gleich wie im vorherigen Code)
 HEIZGRENZE_TEMP = 15.0
 RAUMTEMPERATUR_SOLL = 20.0
+NORM_AUSSENTEMPERATUR = -14.0
+LUEFTUNG_PAUSCHAL_FAKTOR = 0.15 # Pauschaler Lüftungswärmeverlust als Anteil von H_T
+FX_UNBEHEIZT = 0.5 # Temperatur-Korrekturfaktor für Bauteile gegen unbeheizte Räume (z.B. Treppenhaus)
+TREPPENHAUS_WANDANTEIL_STANDARD = 0.1 # Anteil der Außenwandfläche, der auf ein beheiztes Treppenhaus entfällt
+TREPPENHAUS_SOLLTEMPERATUR = 15.0
+U_TRENNWAND_STANDARD = 1.2 # Ungedämmte Trennwand Wohnung/Treppenhaus (W/m²K)
+WOHNFLAECHE_JE_WE_STANDARD = 70.0 # Vorschlag beheizte Nutzfläche je Wohneinheit (m²)
+TREPPENHAUS_FLAECHE_JE_GESCHOSS = 15.0 # Vorschlag Grundfläche beheiztes Treppenhaus je Geschoss (m²)
+WW_BEDARF_PERSON_KWH = 600
+HAUSHALTSSTROM_PERSON_KWH = 1000
+HAUSHALTSSTROM_GRUNDLAST_WE_KWH = 800
 U_WERTE_BAUJAHR_TYPISCH = {
     "Vor 1918": {"Außenwand": 1.7, "Dach": 1.5, "Bodenplatte": 1.2, "Fenster": 4.0},
     "1919-1948": {"Außenwand": 1.6, "Dach": 1.4, "Bodenplatte": 1.0, "Fenster": 3.5},
@@ -60,6 +73,653 @@ def get_u_wert_vorschlag(baujahr_str, komponente):
 def get_fenster_u_wert_vorschlag(fenster_baujahr_str):
     return FENSTER_U_WERTE_BAUJAHR.get(fenster_baujahr_str, 1.3)
 
+# --- Finanzmathematik (vektorisiert über Systeme/Szenarien) ---
+# Alle Funktionen akzeptieren Arrays mit beliebigen führenden Dimensionen (z.B. Szenario x System),
+# die letzte Achse ist jeweils die Zeitachse in Jahren (t = 1..T).
+def berechne_laufende_kosten_verlauf(strom_netz_kWh, einspeisung_kWh, gas_kWh, fernwaerme_kWh, wartung_pa,
+                                     preise, preissteigerungen, jahre):
+    """Laufende Jahreskosten (..., T) mit jährlicher Preissteigerung. Einspeisevergütung bleibt konstant."""
+    t = np.arange(int(jahre))
+    spalte = lambda x: np.asarray(x, dtype=float)[..., None]
+    f_strom = (1 + spalte(preissteigerungen["strom"])) ** t
+    f_gas = (1 + spalte(preissteigerungen["gas"])) ** t
+    f_fw = (1 + spalte(preissteigerungen["fernwaerme"])) ** t
+    return (spalte(strom_netz_kWh) * spalte(preise["strom"]) * f_strom
+            + spalte(gas_kWh) * spalte(preise["gas"]) * f_gas
+            + spalte(fernwaerme_kWh) * spalte(preise["fernwaerme"]) * f_fw
+            - spalte(einspeisung_kWh) * spalte(preise["einspeisung"])
+            + spalte(wartung_pa))
+
+def diskontierungsfaktoren(zinssatz, jahre):
+    """(1+i)^-t für t = 1..T, Form (..., T)."""
+    t = np.arange(1, int(jahre) + 1)
+    return (1 + np.asarray(zinssatz, dtype=float)[..., None]) ** -t
+
+def annuitaetenfaktor(zinssatz, jahre):
+    """Kapitalwiedergewinnungsfaktor i(1+i)^T / ((1+i)^T - 1), bei i = 0 gleich 1/T."""
+    i = np.asarray(zinssatz, dtype=float)
+    q_T = (1 + i) ** jahre
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(np.abs(i) < 1e-12, 1.0 / jahre, i * q_T / (q_T - 1))
+
+def interner_zinsfuss(investition, rueckfluesse, zins_min=-0.99, zins_max=10.0, max_iter=100, toleranz=1e-10):
+    """
+    Interner Zinsfuß für Investition (...,) und jährliche Rückflüsse (..., T).
+    Newton-Verfahren mit Bisektions-Absicherung, gleichzeitig für alle Zeilen.
+    Liefert NaN, wenn im Intervall [zins_min, zins_max] kein Vorzeichenwechsel existiert.
+    """
+    investition = np.asarray(investition, dtype=float)
+    rueckfluesse = np.asarray(rueckfluesse, dtype=float)
+    investition, _ = np.broadcast_arrays(investition, rueckfluesse[..., 0])
+    rueckfluesse_je_jahr = np.ascontiguousarray(np.moveaxis(rueckfluesse, -1, 0))
+
+    def kapitalwert_und_ableitung(r):
+        # Horner-Schema in v = 1/(1+r): kein Potenzieren über die volle (..., T)-Matrix je Iteration
+        v = 1.0 / (1.0 + r)
+        summe = np.zeros_like(r)
+        ableitung_v = np.zeros_like(r)
+        for cf in rueckfluesse_je_jahr[::-1]:
+            ableitung_v = ableitung_v * v + summe + cf
+            summe = (summe + cf) * v
+        return summe - investition, -ableitung_v * v * v
+
+    lo = np.full(investition.shape, zins_min)
+    hi = np.full(investition.shape, zins_max)
+    kw_lo, _ = kapitalwert_und_ableitung(lo)
+    kw_hi, _ = kapitalwert_und_ableitung(hi)
+    gueltig = np.sign(kw_lo) != np.sign(kw_hi)
+
+    # Startwert aus der Näherung Summe Rückflüsse = Investition * (1+r)^(mittlere Laufzeit)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = (rueckfluesse.sum(axis=-1) / investition) ** (2.0 / (rueckfluesse.shape[-1] + 1)) - 1
+    r = np.where(np.isfinite(r), np.clip(r, zins_min + 0.01, zins_max - 0.01), 0.05)
+    for _ in range(max_iter):
+        kw, dkw = kapitalwert_und_ableitung(r)
+        # Intervall so einengen, dass der Vorzeichenwechsel erhalten bleibt
+        gleiche_seite_lo = np.sign(kw) == np.sign(kw_lo)
+        lo = np.where(gleiche_seite_lo, r, lo)
+        kw_lo = np.where(gleiche_seite_lo, kw, kw_lo)
+        hi = np.where(gleiche_seite_lo, hi, r)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r_newton = r - kw / dkw
+        # Newton-Schritt nur übernehmen, wenn er im Intervall bleibt, sonst Bisektion
+        im_intervall = np.isfinite(r_newton) & (r_newton > lo) & (r_newton < hi)
+        r_neu = np.where(im_intervall, r_newton, 0.5 * (lo + hi))
+        if np.all((np.abs(r_neu - r) < toleranz) | ~gueltig):
+            r = r_neu
+            break
+        r = r_neu
+    return np.where(gueltig, r, np.nan)
+
+def berechne_finanzkennzahlen(investition, laufende_kosten, zinssatz, referenz_index=0):
+    """
+    Dynamische Kennzahlen für Investitionen (..., S) und laufende Kosten (..., S, T), S = Systeme.
+    - kapitalwert_kosten: Barwert aller Kosten (Investition + diskontierte laufende Kosten)
+    - annuitaet: Kapitalwert umgelegt auf gleichbleibende Jahresbeträge
+    - amortisation_jahr: erstes Jahr, ab dem das System (diskontiert, kumuliert) dauerhaft nicht teurer
+      ist als das Referenzsystem; NaN, wenn dies im Betrachtungszeitraum nicht eintritt, und für das
+      Referenzsystem selbst
+    Der Zinssatz kann skalar oder je Szenario (...,) angegeben werden.
+    """
+    investition = np.asarray(investition, dtype=float)
+    laufende_kosten = np.asarray(laufende_kosten, dtype=float)
+    jahre = laufende_kosten.shape[-1]
+    zinssatz = np.asarray(zinssatz, dtype=float)[..., None]  # Systemachse ergänzen
+
+    diskontierte_kosten = laufende_kosten * diskontierungsfaktoren(zinssatz, jahre)
+    kapitalwert_kosten = investition + diskontierte_kosten.sum(axis=-1)
+    annuitaet = kapitalwert_kosten * annuitaetenfaktor(zinssatz, jahre)
+
+    # Kumulierte diskontierte Kosten ab Jahr 0 (nur Investition) bis Jahr T
+    kumuliert = np.concatenate([investition[..., None], investition[..., None] + np.cumsum(diskontierte_kosten, axis=-1)], axis=-1)
+    referenz_index = referenz_index % kumuliert.shape[-2] # auch negative Indizes zulassen
+    differenz = kumuliert - kumuliert[..., referenz_index:referenz_index + 1, :]
+    guenstiger = differenz <= 1e-9
+    dauerhaft_guenstiger = np.flip(np.logical_and.accumulate(np.flip(guenstiger, axis=-1), axis=-1), axis=-1)
+    amortisation_jahr = np.where(dauerhaft_guenstiger.any(axis=-1),
+                                 np.argmax(dauerhaft_guenstiger, axis=-1).astype(float), np.nan)
+    amortisation_jahr[..., referenz_index] = np.nan # Vergleich mit sich selbst ist ohne Aussage
+
+    return {
+        "kapitalwert_kosten": kapitalwert_kosten,
+        "annuitaet": annuitaet,
+        "amortisation_jahr": amortisation_jahr,
+    }
+
+# --- Kompakter Ergebnisspeicher (memory-mapped) ---
+# Eine Zeile je Gebäude x System x Szenario mit festem Schema; Monatswerte als Felder fester Breite.
+ERGEBNIS_SCHEMA_VERSION = 1
+ERGEBNIS_DTYPE = np.dtype([
+    ("gebaeude_id", "<i4"), ("szenario_id", "<i4"), ("system_id", "<i2"),
+    ("investition", "<f8"), ("laufende_kosten_jahr", "<f8"),
+    ("kapitalwert_kosten", "<f8"), ("annuitaet", "<f8"),
+    ("strom_netz_kWh", "<f4"), ("gas_kWh", "<f4"), ("fernwaerme_kWh", "<f4"),
+    ("pv_direktverbrauch_kWh", "<f4"), ("pv_einspeisung_kWh", "<f4"),
+    ("monat_strom_netz_kWh", "<f4", (12,)), ("monat_strom_heizsystem_kWh", "<f4", (12,)),
+])
+
+class ErgebnisSpeicher:
+    """
+    Spaltenorientierter Ergebnisspeicher als Binärdatei mit fester Zeilenbreite (ERGEBNIS_DTYPE)
+    plus JSON-Metadaten. Zeilen werden angehängt, gelesen wird über np.memmap, sodass Filter,
+    Sortierung und Seitenabruf blockweise laufen, ohne die Datei vollständig in den RAM zu laden.
+    Die Dateien entstehen erst beim ersten Anhängen; fehlende Dateien gelten als leerer Speicher.
+    """
+    BLOCKGROESSE = 262144  # Zeilen je Leseblock
+
+    def __init__(self, basis_pfad, systeme=None):
+        self.daten_pfad = basis_pfad + ".erg"
+        self.meta_pfad = basis_pfad + ".erg.json"
+        if os.path.exists(self.meta_pfad):
+            with open(self.meta_pfad) as f:
+                self.meta = json.load(f)
+            if self.meta.get("schema_version") != ERGEBNIS_SCHEMA_VERSION or \
+               np.dtype([tuple(feld) for feld in self.meta["dtype"]]) != ERGEBNIS_DTYPE:
+                raise ValueError(f"Ergebnisspeicher '{self.daten_pfad}' hat ein inkompatibles Schema.")
+        else:
+            self.meta = {"schema_version": ERGEBNIS_SCHEMA_VERSION,
+                         "dtype": [list(feld) for feld in ERGEBNIS_DTYPE.descr],
+                         "systeme": list(systeme or [])}
+
+    def __len__(self):
+        if not os.path.exists(self.daten_pfad):
+            return 0
+        return os.path.getsize(self.daten_pfad) // ERGEBNIS_DTYPE.itemsize
+
+    def naechste_szenario_id(self):
+        n = len(self)
+        if n == 0:
+            return 0
+        return int(max(block["szenario_id"].max() for block in self._bloecke(["szenario_id"]))) + 1
+
+    def anhaengen(self, zeilen):
+        """Hängt ein strukturiertes Array (ERGEBNIS_DTYPE) an die Datei an."""
+        zeilen = np.asarray(zeilen, dtype=ERGEBNIS_DTYPE)
+        if not os.path.exists(self.meta_pfad):
+            with open(self.meta_pfad, "w") as f:
+                json.dump(self.meta, f)
+        with open(self.daten_pfad, "ab") as f:
+            f.write(zeilen.tobytes())
+
+    def _memmap(self):
+        n = len(self)
+        if n == 0:
+            return np.zeros(0, dtype=ERGEBNIS_DTYPE)
+        return np.memmap(self.daten_pfad, dtype=ERGEBNIS_DTYPE, mode="r", shape=(n,))
+
+    def _bloecke(self, felder):
+        mm = self._memmap()
+        for start in range(0, len(mm), self.BLOCKGROESSE):
+            block = mm[start:start + self.BLOCKGROESSE]
+            yield {feld: np.asarray(block[feld]) for feld in felder}
+
+    def abfrage(self, filter_bereiche=None, sortieren_nach=None, absteigend=False, offset=0, limit=100):
+        """
+        Gibt (Trefferanzahl, Seite als strukturiertes Array) zurück.
+        filter_bereiche: {feld: (min, max)} mit inklusiven Grenzen, None = offen.
+        Es werden nur die Filter-/Sortierspalten blockweise gelesen, danach nur die Zeilen der Seite.
+        """
+        filter_bereiche = filter_bereiche or {}
+        felder = list(filter_bereiche) + ([sortieren_nach] if sortieren_nach else [])
+        indizes, schluessel, start = [], [], 0
+        for block in self._bloecke(felder or ["gebaeude_id"]):
+            blocklaenge = len(next(iter(block.values())))
+            maske = np.ones(blocklaenge, dtype=bool)
+            for feld, (minimum, maximum) in filter_bereiche.items():
+                if minimum is not None: maske &= block[feld] >= minimum
+                if maximum is not None: maske &= block[feld] <= maximum
+            treffer = np.nonzero(maske)[0]
+            indizes.append(treffer + start)
+            if sortieren_nach:
+                schluessel.append(block[sortieren_nach][treffer])
+            start += blocklaenge
+        if not indizes:
+            return 0, np.zeros(0, dtype=ERGEBNIS_DTYPE)
+        indizes = np.concatenate(indizes)
+        if sortieren_nach:
+            reihenfolge = np.argsort(np.concatenate(schluessel), kind="stable")
+            if absteigend: reihenfolge = reihenfolge[::-1]
+            indizes = indizes[reihenfolge]
+        seite = indizes[offset:offset + limit]
+        return len(indizes), np.array(self._memmap()[seite])
+
+    def stichprobe(self, felder, max_punkte=5000):
+        """Gleichmäßig ausgedünnte Spalten für Übersichtsgrafiken über den gesamten Bestand."""
+        mm = self._memmap()
+        schritt = max(1, -(-len(mm) // max_punkte))
+        auswahl = mm[::schritt]
+        return {feld: np.array(auswahl[feld]) for feld in felder}
+
+def ergebnisse_zu_zeilen(results_liste, investition, finanzkennzahlen, gebaeude_id=0, szenario_id=0):
+    """Wandelt die Ergebnis-Dicts von berechne_system_details_v2 in Zeilen des Ergebnisspeichers um."""
+    zeilen = np.zeros(len(results_liste), dtype=ERGEBNIS_DTYPE)
+    zeilen["gebaeude_id"] = gebaeude_id
+    zeilen["szenario_id"] = szenario_id
+    zeilen["system_id"] = np.arange(len(results_liste))
+    zeilen["investition"] = investition
+    zeilen["kapitalwert_kosten"] = finanzkennzahlen["kapitalwert_kosten"]
+    zeilen["annuitaet"] = finanzkennzahlen["annuitaet"]
+    for feld, schluessel in [("laufende_kosten_jahr", "gesamte_laufende_kosten_jahr"),
+                             ("strom_netz_kWh", "jahresverbrauch_strom_netz"), ("gas_kWh", "jahresverbrauch_gas"),
+                             ("fernwaerme_kWh", "jahresverbrauch_fernwaerme"),
+                             ("pv_direktverbrauch_kWh", "pv_direktverbrauch_jahr"), ("pv_einspeisung_kWh", "pv_einspeisung_jahr"),
+                             ("monat_strom_netz_kWh", "monatlicher_strom_netzbezug"),
+                             ("monat_strom_heizsystem_kWh", "monatlicher_strom_heizsystem")]:
+        zeilen[feld] = [res[schluessel] for res in results_liste]
+    return zeilen
+
+# --- Mehrzonenmodell (vektorisiert über Zonen/Wohneinheiten) ---
+# Jede Zeile der Zonentabelle beschreibt eine Zone bzw. einen Wohnungstyp; "Anzahl" gleichartige Einheiten
+# werden nur einmal gerechnet und beim Aufsummieren gewichtet.
+ZONEN_SPALTEN = {
+    "Zone": "WE", "Anzahl": 1, "Beheizt": True, "Solltemperatur (°C)": RAUMTEMPERATUR_SOLL, "Personen": 2.5,
+    "Nutzfläche (m²)": WOHNFLAECHE_JE_WE_STANDARD,
+    "A Außenwand (m²)": 0.0, "U Außenwand": 0.0, "A Dach (m²)": 0.0, "U Dach": 0.0,
+    "A Boden (m²)": 0.0, "U Boden": 0.0, "A Fenster (m²)": 0.0, "U Fenster": 0.0,
+    "A Wand zu unbeheizt (m²)": 0.0, "U Wand zu unbeheizt": 0.0,
+}
+
+def erzeuge_zonentabelle(anzahl_we, anzahl_geschosse, treppenhaus_beheizt, flaechen, u_werte, personen_gesamt,
+                         treppenhaus_wandanteil=TREPPENHAUS_WANDANTEIL_STANDARD, trennwand_flaeche=0.0,
+                         u_trennwand=U_TRENNWAND_STANDARD):
+    """
+    Verteilt die Hüllflächen des Gebäudes auf einzelne Wohneinheiten: Dachflächen auf das oberste,
+    Bodenflächen auf das unterste Geschoss, Wand- und Fensterflächen gleichmäßig. Ein beheiztes
+    Treppenhaus wird als eigene Zone mit treppenhaus_wandanteil der vorhandenen Außenwand geführt.
+    Trennwände zu einem unbeheizten Treppenhaus (Gesamtfläche trennwand_flaeche) kommen nur hinzu,
+    wenn sie angegeben werden; ohne sie entspricht die Summe H_T dem Einzonenmodell.
+    """
+    anzahl_we = max(1, int(anzahl_we))
+    anzahl_geschosse = max(1, min(int(anzahl_geschosse), anzahl_we))
+    geschoss = np.arange(anzahl_we) * anzahl_geschosse // anzahl_we
+    we_oben = np.sum(geschoss == anzahl_geschosse - 1)
+    we_unten = np.sum(geschoss == 0)
+    anteil_wand_we = 1.0 - treppenhaus_wandanteil if treppenhaus_beheizt else 1.0
+
+    zeilen = []
+    for i in range(anzahl_we):
+        zeilen.append({
+            **ZONEN_SPALTEN,
+            "Zone": f"WE {i + 1:03d} (Geschoss {geschoss[i]})",
+            "Personen": personen_gesamt / anzahl_we,
+            "A Außenwand (m²)": flaechen["aussenwand"] * anteil_wand_we / anzahl_we, "U Außenwand": u_werte["aussenwand"],
+            "A Dach (m²)": flaechen["dach"] / we_oben if geschoss[i] == anzahl_geschosse - 1 else 0.0, "U Dach": u_werte["dach"],
+            "A Boden (m²)": flaechen["boden"] / we_unten if geschoss[i] == 0 else 0.0, "U Boden": u_werte["boden"],
+            "A Fenster (m²)": flaechen["fenster"] / anzahl_we, "U Fenster": u_werte["fenster"],
+            "A Wand zu unbeheizt (m²)": 0.0 if treppenhaus_beheizt else trennwand_flaeche / anzahl_we, "U Wand zu unbeheizt": u_trennwand,
+        })
+    if treppenhaus_beheizt:
+        zeilen.append({
+            **ZONEN_SPALTEN, "Zone": "Treppenhaus", "Solltemperatur (°C)": TREPPENHAUS_SOLLTEMPERATUR, "Personen": 0.0,
+            "Nutzfläche (m²)": TREPPENHAUS_FLAECHE_JE_GESCHOSS * anzahl_geschosse,
+            "A Außenwand (m²)": flaechen["aussenwand"] * (1 - anteil_wand_we), "U Außenwand": u_werte["aussenwand"],
+        })
+    return zeilen
+
+def berechne_zonenmodell(zonen_df, temp_profil, energiesparfaktor):
+    """
+    Heizwärme-, Warmwasser- und Haushaltsstrombedarf je Zone als Array-Operationen über alle Zonen.
+    Werte gelten je Einheit der Zone; die Gebäudesumme ergibt sich mit Gewichtung "Anzahl".
+    """
+    spalte = lambda name: zonen_df[name].fillna(ZONEN_SPALTEN[name]).to_numpy(dtype=float)
+    anzahl = spalte("Anzahl")
+    beheizt = zonen_df["Beheizt"].fillna(True).to_numpy(dtype=bool)
+    soll = spalte("Solltemperatur (°C)")
+    personen = spalte("Personen")
+
+    H_T_fenster = spalte("A Fenster (m²)") * spalte("U Fenster")
+    H_T = (spalte("A Außenwand (m²)") * spalte("U Außenwand") + spalte("A Dach (m²)") * spalte("U Dach")
+           + spalte("A Boden (m²)") * spalte("U Boden") + H_T_fenster
+           + FX_UNBEHEIZT * spalte("A Wand zu unbeheizt (m²)") * spalte("U Wand zu unbeheizt"))
+    H_TR = H_T * (1 + LUEFTUNG_PAUSCHAL_FAKTOR) * beheizt
+
+    t_mittel = temp_profil["Mitteltemperatur"].to_numpy(dtype=float)
+    stunden = temp_profil["TageImMonat"].to_numpy(dtype=float) * 24
+    delta_T = np.maximum(0, soll[:, None] - t_mittel[None, :])  # (Zonen, 12)
+    aktiv = (t_mittel[None, :] < HEIZGRENZE_TEMP) & (soll[:, None] > t_mittel[None, :])
+    heizwaerme_monat = H_TR[:, None] * delta_T * stunden[None, :] * aktiv / 1000
+
+    ist_wohneinheit = beheizt & (personen > 0)
+    ww_jahr = personen * WW_BEDARF_PERSON_KWH * (1 - energiesparfaktor * 0.5)
+    haushaltsstrom_jahr = (personen * HAUSHALTSSTROM_PERSON_KWH + ist_wohneinheit * HAUSHALTSSTROM_GRUNDLAST_WE_KWH) * (1 - energiesparfaktor)
+
+    return {
+        "anzahl": anzahl, "beheizt": beheizt, "soll": soll, "H_T": H_T, "H_T_fenster": H_T_fenster,
+        "A_fenster": spalte("A Fenster (m²)"), "H_TR": H_TR, "heizwaerme_monat": heizwaerme_monat,
+        "heizlast_kW": H_TR * np.maximum(0, soll - NORM_AUSSENTEMPERATUR) / 1000,
+        "ww_jahr": ww_jahr, "haushaltsstrom_jahr": haushaltsstrom_jahr,
+        "personen": personen, "anzahl_wohneinheiten": float(np.sum(anzahl * ist_wohneinheit)),
+        "ist_wohneinheit": ist_wohneinheit, "nutzflaeche": spalte("Nutzfläche (m²)"),
+    }
+
+# --- Dynamisches Stundenmodell (5R1C nach DIN EN ISO 13790, vektorisiert über Gebäude) ---
+GLOBALSTRAHLUNG_JAHR_KWH_M2 = 1050 # Horizontale Globalstrahlung Referenzstandort
+INTERNE_GEWINNE_W_M2 = 5.0 # Mittlere interne Wärmegewinne Wohngebäude (DIN V 4108-6)
+FENSTER_SOLARFAKTOR = 0.6 * 0.7 * 0.9 * 0.45 # g-Wert x Rahmenanteil x Verschattung x Mittel vertikal/horizontal
+BAUSCHWERE = { # Wirksame Wärmekapazität C_m (J/m²K) und wirksame Massefläche A_m (m²) je m² Nutzfläche
+    "Leicht": {"C_m": 80000, "A_m": 2.5},
+    "Mittel": {"C_m": 165000, "A_m": 2.5},
+    "Schwer": {"C_m": 260000, "A_m": 3.0},
+}
+
+def erzeuge_stundenklima(temp_profil):
+    """
+    Synthetisches Referenzjahr (8760 h) aus dem monatlichen Temperaturprofil: Tagesmittel zwischen den
+    Monatsmitten interpoliert, Tagesgang als Kosinus mit Monatsamplitude (Maximum 15 Uhr).
+    Globalstrahlung aus dem relativen PV-Monatsprofil und dem PV-Tagesgang.
+    """
+    tage = temp_profil["TageImMonat"].to_numpy()
+    monat_je_tag = np.repeat(np.arange(12), tage)
+    tag_im_jahr = np.arange(len(monat_je_tag)) + 0.5
+    monatsmitte = np.cumsum(tage) - tage / 2
+    # Periodische Interpolation über den Jahreswechsel
+    stuetzstellen = np.concatenate([monatsmitte[-1:] - 365, monatsmitte, monatsmitte[:1] + 365])
+    interpoliere = lambda werte: np.interp(tag_im_jahr, stuetzstellen, np.concatenate([werte[-1:], werte, werte[:1]]))
+    t_mittel_monat = temp_profil["Mitteltemperatur"].to_numpy(dtype=float)
+    t_mittel_tag = interpoliere(t_mittel_monat)
+    # Monatsmittel nach der Interpolation wieder exakt auf das Referenzprofil setzen
+    t_mittel_tag += (t_mittel_monat - np.bincount(monat_je_tag, t_mittel_tag) / tage)[monat_je_tag]
+    amplitude_tag = interpoliere((temp_profil["Max-Temperatur"] - temp_profil["Min-Temperatur"]).to_numpy(dtype=float) / 2)
+
+    stunde = np.arange(24)
+    temperatur = (t_mittel_tag[:, None] + amplitude_tag[:, None] * np.cos(2 * np.pi * (stunde[None, :] - 15) / 24)).ravel()
+    strahlung_tag_kWh = np.array([PV_ERTRAG_PROFIL_RELATIV[m + 1] for m in monat_je_tag]) * GLOBALSTRAHLUNG_JAHR_KWH_M2 / tage[monat_je_tag]
+    globalstrahlung = (strahlung_tag_kWh[:, None] * 1000 * pv_daily_shape[None, :] / pv_daily_shape.sum()).ravel()
+    return pd.DataFrame({
+        "MonatNr": np.repeat(monat_je_tag + 1, 24), "Stunde": np.tile(stunde, len(monat_je_tag)),
+        "Temperatur": temperatur, "Globalstrahlung_W_m2": globalstrahlung,
+    })
+
+def pruefe_5r1c_parameter(H_tr_op, H_ve, A_f, A_m):
+    """
+    Maske der Gebäude, für die das 5R1C-Netz nicht definiert ist: ohne Nutzfläche/Lüftung oder mit
+    H_tr_op >= H_tr_ms (= 9.1 A_m), wodurch H_tr_em negativ bzw. unendlich würde.
+    """
+    H_tr_op, H_ve, A_f, A_m = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (H_tr_op, H_ve, A_f, A_m)])
+    return ~((A_f > 0) & (H_ve > 0) & (H_tr_op > 0) & (H_tr_op < 9.1 * A_m))
+
+def simuliere_5r1c(H_tr_op, H_tr_w, H_ve, A_f, C_m, A_m, theta_e, phi_int, phi_sol, theta_soll, phi_max=None):
+    """
+    Stündliche Simulation des 5R1C-Modells (ISO 13790 Anhang C) für B Gebäude gleichzeitig.
+    Gebäudeparameter als Arrays (B,) in W/K, m² bzw. J/K; Zeitreihen als (8760,) oder (B, 8760) in °C bzw. W.
+    Die Heizleistung wird je Stunde so bestimmt, dass die Lufttemperatur den Sollwert erreicht
+    (optional begrenzt auf phi_max). Rückgabe: Heizleistung und Lufttemperatur, jeweils (B, 8760).
+    Unzulässige Parameter (siehe pruefe_5r1c_parameter) oder nicht endliche Ergebnisse lösen ValueError aus.
+    """
+    H_tr_op, H_tr_w, H_ve, A_f, C_m, A_m = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in (H_tr_op, H_tr_w, H_ve, A_f, C_m, A_m)])
+    ungueltig = pruefe_5r1c_parameter(H_tr_op, H_ve, A_f, A_m)
+    if np.any(ungueltig):
+        raise ValueError(f"5R1C-Parameter unzulässig für Gebäude-Index {np.flatnonzero(ungueltig).tolist()} "
+                         "(Nutzfläche/Lüftung > 0 und H_tr_op < 9.1 A_m erforderlich).")
+    anzahl_stunden = np.shape(theta_e)[-1]
+    zeitreihe = lambda x: np.broadcast_to(np.asarray(x, dtype=float), H_tr_op.shape + (anzahl_stunden,))
+    theta_e, phi_int, phi_sol, theta_soll = (zeitreihe(x) for x in (theta_e, phi_int, phi_sol, theta_soll))
+
+    A_t = 4.5 * A_f
+    H_tr_is = 3.45 * A_t
+    H_tr_ms = 9.1 * A_m
+    H_tr_em = 1 / (1 / H_tr_op - 1 / H_tr_ms)
+    H_tr_1 = 1 / (1 / H_ve + 1 / H_tr_is)
+    H_tr_2 = H_tr_1 + H_tr_w
+    H_tr_3 = 1 / (1 / H_tr_2 + 1 / H_tr_ms)
+    c_h = C_m / 3600
+    phi_10 = 10 * A_f # Testleistung 10 W/m² zur Bestimmung der Leistungs-Temperatur-Steigung
+
+    def schritt(theta_m_alt, t, phi_hc):
+        theta_e_t = theta_e[..., t]
+        phi_ia = 0.5 * phi_int[..., t]
+        phi_m = A_m / A_t * (0.5 * phi_int[..., t] + phi_sol[..., t])
+        phi_st = (1 - A_m / A_t - H_tr_w / (9.1 * A_t)) * (0.5 * phi_int[..., t] + phi_sol[..., t])
+        phi_mtot = phi_m + H_tr_em * theta_e_t + H_tr_3 * (phi_st + H_tr_w * theta_e_t + H_tr_1 * ((phi_ia + phi_hc) / H_ve + theta_e_t)) / H_tr_2
+        theta_m_neu = (theta_m_alt * (c_h - 0.5 * (H_tr_3 + H_tr_em)) + phi_mtot) / (c_h + 0.5 * (H_tr_3 + H_tr_em))
+        theta_m = 0.5 * (theta_m_neu + theta_m_alt)
+        theta_s = (H_tr_ms * theta_m + phi_st + H_tr_w * theta_e_t + H_tr_1 * (theta_e_t + (phi_ia + phi_hc) / H_ve)) / (H_tr_ms + H_tr_w + H_tr_1)
+        theta_air = (H_tr_is * theta_s + H_ve * theta_e_t + phi_ia + phi_hc) / (H_tr_is + H_ve)
+        return theta_m_neu, theta_air
+
+    heizleistung = np.zeros(H_tr_op.shape + (anzahl_stunden,))
+    lufttemperatur = np.zeros(H_tr_op.shape + (anzahl_stunden,))
+    theta_m_alt = theta_soll[..., 0].copy()
+    # Alle Knotentemperaturen sind affin in der Heizleistung mit zeitlich konstanter Steigung.
+    # Die Steigung wird einmal mit der Testleistung bestimmt, danach genügt ein Schritt je Stunde.
+    theta_m_ref, theta_air_ref = schritt(theta_m_alt, 0, 0.0)
+    theta_m_test, theta_air_test = schritt(theta_m_alt, 0, phi_10)
+    d_theta_m = (theta_m_test - theta_m_ref) / phi_10
+    d_theta_air = (theta_air_test - theta_air_ref) / phi_10
+    for t in range(anzahl_stunden):
+        theta_m_0, theta_air_0 = schritt(theta_m_alt, t, 0.0)
+        phi_hc = np.maximum(0.0, (theta_soll[..., t] - theta_air_0) / d_theta_air)
+        if phi_max is not None:
+            phi_hc = np.minimum(phi_hc, phi_max)
+        theta_m_alt = theta_m_0 + phi_hc * d_theta_m
+        heizleistung[..., t] = phi_hc
+        lufttemperatur[..., t] = theta_air_0 + phi_hc * d_theta_air
+    if not np.all(np.isfinite(heizleistung)):
+        raise ValueError("5R1C-Simulation liefert nicht endliche Heizleistungen.")
+    return {"heizleistung_W": heizleistung, "lufttemperatur": lufttemperatur}
+
+@st.cache_data(max_entries=16, show_spinner="Stundensimulation läuft ...")
+def simuliere_5r1c_gecacht(anzahl, *args, **kwargs):
+    """
+    Wie simuliere_5r1c, hält im (sitzungsübergreifenden) Cache aber nur die verdichteten Ergebnisse:
+    mit "anzahl" gewichtete stündliche Gebäudeheizleistung (8760,) und Jahres-Heizwärme je Gebäude/Zone (B,).
+    """
+    heizleistung = simuliere_5r1c(*args, **kwargs)["heizleistung_W"]
+    return {"heizleistung_gebaeude_W": np.asarray(anzahl, dtype=float) @ heizleistung,
+            "heizwaerme_kWh": heizleistung.sum(axis=1) / 1000}
+
+REFERENCE_HOURLY_CLIMATE = erzeuge_stundenklima(REFERENCE_TEMP_PROFILE)
+
+# --- Diagramme: Datenreduktion und Figuren-Cache ---
+# Figuren werden über st.cache_data anhand ihrer Eingangsdaten wiederverwendet. Lange Zeitreihen werden
+# min/max-erhaltend auf eine pixelbegrenzte Punktzahl reduziert und als WebGL-Traces ausgeliefert,
+# damit Datenmenge und Renderzeit unabhängig von der Simulationsauflösung bleiben.
+DIAGRAMM_MAX_PUNKTE = 2000 # ca. zwei Punkte (Min/Max) je Pixelspalte eines breiten Diagramms
+WEBGL_AB_PUNKTEN = 1000
+
+def reduziere_minmax(x, y, max_punkte=DIAGRAMM_MAX_PUNKTE):
+    """Teilt die Reihe in max_punkte/2 Abschnitte und behält je Abschnitt Minimum und Maximum in zeitlicher Reihenfolge."""
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_punkte:
+        return x, y
+    anzahl_abschnitte = max_punkte // 2
+    abschnittslaenge = -(-n // anzahl_abschnitte)
+    auffuellung = anzahl_abschnitte * abschnittslaenge - n
+    y_block = np.concatenate([y, np.full(auffuellung, np.nan)]).reshape(anzahl_abschnitte, abschnittslaenge)
+    y_ohne_nan = np.isnan(y_block)
+    i_min = np.argmin(np.where(y_ohne_nan, np.inf, y_block), axis=1)
+    i_max = np.argmax(np.where(y_ohne_nan, -np.inf, y_block), axis=1)
+    start = np.arange(anzahl_abschnitte) * abschnittslaenge
+    auswahl = np.unique(np.concatenate([start + i_min, start + i_max]))
+    auswahl = auswahl[auswahl < n]
+    return x[auswahl], y[auswahl]
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def zeitreihen_figur(x, reihen, titel, x_titel, y_titel, fenster=None, max_punkte=DIAGRAMM_MAX_PUNKTE):
+    """
+    Liniendiagramm für lange Zeitreihen. reihen: {Name: y-Array}. fenster: (x_von, x_bis) als Detailausschnitt,
+    der in voller Auflösung neu reduziert wird, statt das ganze Jahr zu übertragen.
+    """
+    x = np.asarray(x)
+    maske = np.ones(len(x), dtype=bool) if fenster is None else (x >= fenster[0]) & (x <= fenster[1])
+    fig = go.Figure()
+    for name, y in reihen.items():
+        x_red, y_red = reduziere_minmax(x[maske], np.asarray(y)[maske], max_punkte)
+        trace_typ = go.Scattergl if maske.sum() > WEBGL_AB_PUNKTEN else go.Scatter
+        fig.add_trace(trace_typ(x=x_red, y=y_red, name=name, mode="lines"))
+    fig.update_layout(title_text=titel, xaxis_title=x_titel, yaxis_title=y_titel)
+    return fig
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def temperatur_figur(temp_profil):
+    return px.line(temp_profil, x="Monat", y=["Mitteltemperatur", "Min-Temperatur", "Max-Temperatur"],
+                   labels={"value": "Temperatur (°C)", "variable": "Profil"}, markers=True)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def energiebilanz_figur(plot_df):
+    fig = go.Figure()
+    for spalte in [c for c in plot_df.columns if c != "Monat"]:
+        fig.add_trace(go.Bar(x=plot_df["Monat"], y=plot_df[spalte], name=spalte))
+    fig.update_layout(barmode='relative', title_text='Monatliche Energieflüsse (Bedarfe vs. PV Erzeugung)',
+                      xaxis_title="Monat", yaxis_title="Energie (kWh)")
+    return fig
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def prognose_figur(prognose_df, jahre):
+    return px.line(prognose_df, x="Jahr", y="Kumulierte Kosten", color="System",
+                   title=f"Kumulierte Gesamtkosten über {jahre} Jahre", markers=True)
+
+# --- Projektdateien (versioniert, atomar, Array-Daten lazy) ---
+# Ein Projekt ist ein ZIP-Container mit "projekt.json" (Schema-Version, Parameter, Tabellenverzeichnis)
+# und unkomprimierten .npy-Einträgen für Array-Daten. Ältere Schemata werden beim Laden automatisch migriert.
+PROJEKT_SCHEMA_VERSION = 2
+PROJEKT_ENDUNG = ".mfhprojekt"
+PROJEKT_TABELLEN = { # Parameter, die als spaltenweise Arrays statt in JSON gespeichert werden, mit Spaltenvorlage
+    "zonen_tabelle": ZONEN_SPALTEN,
+}
+
+def tabelle_zu_spalten(zeilen, vorlage):
+    """
+    Liste von Dicts (oder Spalten-Dict) -> {Spaltenname: Array}. Typ und Ersatzwert für fehlende Einträge
+    kommen aus der Spaltenvorlage (bool/int/float/str); Spalten ohne Vorlage werden float bzw. Text.
+    """
+    df = pd.DataFrame(zeilen)
+    spalten = {}
+    for name in df.columns:
+        werte = df[name]
+        if name in vorlage:
+            standard = vorlage[name]
+            typ = str if isinstance(standard, str) else type(standard)
+            spalten[name] = werte.fillna(standard).astype(typ).to_numpy(dtype=typ)
+        elif pd.api.types.is_numeric_dtype(werte):
+            spalten[name] = werte.to_numpy(dtype=float)
+        else:
+            spalten[name] = werte.fillna("").astype(str).to_numpy(dtype=str)
+    return spalten
+
+def _projekt_json_wert(o):
+    """json.dumps-Fallback: nur NumPy-Skalare werden umgewandelt, alle anderen Typen sind ein Fehler."""
+    if isinstance(o, np.bool_):
+        return bool(o)
+    if isinstance(o, np.integer):
+        return int(o)
+    if isinstance(o, np.floating):
+        return float(o)
+    raise TypeError(f"Wert vom Typ {type(o).__name__} kann nicht im Projekt gespeichert werden.")
+
+class ProjektArrays:
+    """Liest Array-Einträge eines Projektcontainers erst beim ersten Zugriff."""
+    def __init__(self, quelle=None, verzeichnis=None, vorgeladen=None):
+        self.quelle = quelle # Dateipfad oder Bytes
+        self.verzeichnis = verzeichnis or {}
+        self._cache = dict(vorgeladen or {})
+
+    def __contains__(self, name):
+        return name in self.verzeichnis or name in self._cache
+
+    def tabelle(self, name):
+        if name not in self._cache:
+            quelle = io.BytesIO(self.quelle) if isinstance(self.quelle, bytes) else self.quelle
+            with zipfile.ZipFile(quelle) as zf:
+                self._cache[name] = {spalte: np.lib.format.read_array(zf.open(f"{name}/{i}.npy"), allow_pickle=False)
+                                     for i, spalte in enumerate(self.verzeichnis[name])}
+        # Typen beim Lesen nach Spaltenvorlage herstellen (auch für ältere Dateien mit float-Anzahl)
+        spalten = tabelle_zu_spalten(self._cache[name], PROJEKT_TABELLEN[name])
+        return pd.DataFrame({k: v.tolist() for k, v in spalten.items()}).to_dict("records")
+
+def projekt_zu_bytes(parameter, tabellen):
+    """Serialisiert Parameter (JSON) und Tabellen (spaltenweise .npy) in einen Projektcontainer."""
+    puffer = io.BytesIO()
+    verzeichnis = {}
+    with zipfile.ZipFile(puffer, "w", compression=zipfile.ZIP_STORED) as zf:
+        for name, zeilen in tabellen.items():
+            spalten = tabelle_zu_spalten(zeilen, PROJEKT_TABELLEN[name])
+            verzeichnis[name] = list(spalten)
+            for i, werte in enumerate(spalten.values()):
+                with zf.open(f"{name}/{i}.npy", "w") as f:
+                    np.lib.format.write_array(f, werte, allow_pickle=False)
+        zf.writestr("projekt.json", json.dumps({
+            "schema_version": PROJEKT_SCHEMA_VERSION, "gespeichert": datetime.now().isoformat(timespec="seconds"),
+            "parameter": parameter, "tabellen": verzeichnis,
+        }, ensure_ascii=False, separators=(",", ":"), default=_projekt_json_wert))
+    return puffer.getvalue()
+
+def speichere_atomar(pfad, daten):
+    """Schreibt zuerst in eine temporäre Datei im Zielordner und ersetzt dann atomar die Zieldatei."""
+    fd, tmp_pfad = tempfile.mkstemp(dir=os.path.dirname(pfad) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(daten)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pfad, pfad)
+    except BaseException:
+        if os.path.exists(tmp_pfad): os.remove(tmp_pfad)
+        raise
+
+def _migriere_v1_zu_v2(daten):
+    """v1: flaches JSON-Dict der session_state-Werte inkl. Zonentabelle als Liste von Dicts."""
+    parameter = dict(daten)
+    tabellen = {name: tabelle_zu_spalten(parameter.pop(name), vorlage) for name, vorlage in PROJEKT_TABELLEN.items() if parameter.get(name)}
+    if "zonen_tabelle" in tabellen: # Herkunft alter Tabellen unbekannt -> wie manuell bearbeitet behandeln, nicht neu erzeugen
+        parameter.setdefault("zonen_tabelle_manuell", True)
+    return {"schema_version": 2, "parameter": parameter, "tabellen": {k: list(v) for k, v in tabellen.items()}}, tabellen
+
+PROJEKT_MIGRATIONEN = {1: _migriere_v1_zu_v2} # Version n -> n+1
+
+def lade_projekt(quelle):
+    """
+    Liest Metadaten aus einem Projektcontainer (Pfad oder Bytes) oder einer alten JSON-Datei und migriert
+    sie auf PROJEKT_SCHEMA_VERSION. Rückgabe: (Parameter, ProjektArrays); Arrays werden erst bei Bedarf gelesen.
+    """
+    rohdaten = quelle if isinstance(quelle, bytes) else None
+    if rohdaten is None:
+        with open(quelle, "rb") as f:
+            rohdaten = f.read(4)
+    if rohdaten[:4] == b"PK\x03\x04":
+        with zipfile.ZipFile(io.BytesIO(quelle) if isinstance(quelle, bytes) else quelle) as zf:
+            meta = json.loads(zf.read("projekt.json"))
+        arrays = ProjektArrays(quelle, meta.get("tabellen", {}))
+    else:
+        if isinstance(quelle, bytes):
+            meta = json.loads(quelle.decode("utf-8"))
+        else:
+            with open(quelle, encoding="utf-8") as f:
+                meta = json.load(f)
+        arrays = ProjektArrays()
+
+    version = meta.get("schema_version", 1) if "parameter" in meta else 1
+    if version > PROJEKT_SCHEMA_VERSION:
+        raise ValueError(f"Projektdatei hat Schema-Version {version}, unterstützt wird bis {PROJEKT_SCHEMA_VERSION}.")
+    while version < PROJEKT_SCHEMA_VERSION:
+        meta, vorgeladen = PROJEKT_MIGRATIONEN[version](meta)
+        arrays = ProjektArrays(verzeichnis=meta["tabellen"], vorgeladen=vorgeladen)
+        version = meta["schema_version"]
+    return meta["parameter"], arrays
+
+def uebernehme_projekt(parameter, arrays):
+    """
+    Setzt die Projektwerte in den session_state. Wird als Widget-Callback vor dem Skriptdurchlauf
+    aufgerufen, damit die Werte ohne erneutes Laden der Seite in allen Widgets erscheinen.
+    Übernommen werden nur bekannte Parameter und "*_manually_set"-Markierungen; Rückgabe: ignorierte Schlüssel.
+    """
+    for key in [k for k in st.session_state if str(k).endswith("_manually_set")] + ["zonen_editor", "zonen_tabelle_bearbeitet"]:
+        st.session_state.pop(key, None)
+    for key, value in default_werte.items(): # Fehlende Werte auf Standard zurücksetzen statt Altwerte zu behalten
+        st.session_state[key] = parameter.get(key, value)
+    ignoriert = []
+    for key, value in parameter.items():
+        if key in default_werte:
+            continue
+        if str(key).endswith("_manually_set"):
+            st.session_state[key] = bool(value)
+        else:
+            ignoriert.append(key)
+    st.session_state.zonen_tabelle = []
+    st.session_state.projekt_arrays = arrays # Tabellen werden erst im jeweiligen Tab gelesen
+    return ignoriert
+
 # --- PDF Export Klasse ---
 class PDF(FPDF):
     def header(self):
@@ -108,10 +768,17 @@ default_werte = {
     "anzahl_personen": 10, "energiesparfaktor_allgemein": 0.1,
     "strompreis": 0.30, "gaspreis": 0.10, "fernwaermepreis": 0.12, "einspeiseverguetung": 0.08,
     "prognose_jahre": 15, "preissteigerung_strom": 3.0, "preissteigerung_gas": 4.0, "preissteigerung_fernwaerme": 3.5,
+    "kalkulationszins": 3.0, "referenzsystem": "Gasheizung",
     # Gebäudeparameter
     "baujahr_haus_str": list(U_WERTE_BAUJAHR_TYPISCH.keys())[-3], "keller_option": "Unterkellert",
     "flaeche_aussenwand_gesamt": 300.0, "aussenwand_gedaemmt_anteil": 1.0, "u_aussenwand_gedaemmt": 0.0, "u_aussenwand_ungedaemmt": 0.0,
     "daemmstandard_wand": "Baujahrstandard",
+    # Dynamisches Stundenmodell (5R1C)
+    "use_5r1c": False, "nutzflaeche": 250.0, "bauschwere": "Mittel", "nachtabsenkung_K": 3.0,
+    # Mehrzonenmodell
+    "use_zonenmodell": False, "zonen_anzahl_we": 8, "zonen_geschosse": 4, "zonen_treppenhaus_beheizt": False,
+    "zonen_treppenhaus_wandanteil": TREPPENHAUS_WANDANTEIL_STANDARD, "zonen_trennwand_flaeche": 0.0, "zonen_trennwand_u": U_TRENNWAND_STANDARD,
+    "zonen_tabelle": [], "zonen_tabelle_quelle": "", "zonen_tabelle_manuell": False,
     "flaeche_dach": 150.0, "flaeche_boden": 150.0, "flaeche_fenster_gesamt": 40.0,
     "fenster_baujahr_str": list(FENSTER_U_WERTE_BAUJAHR.keys())[-1],
     "u_dach": 0.0, "u_boden": 0.0, "u_fenster": 0.0, # Werden initialisiert
@@ -152,42 +819,54 @@ with st.sidebar.expander("Projekt Speichern & Laden", expanded=False):
     st.text_input("Benutzer/Team-Kürzel (für Dateiname)", value=st.session_state.user_name, key="user_name")
     st.text_input("Projektname (für Dateiname)", value=st.session_state.project_name, key="project_name")
     
-    file_basename = f"{st.session_state.user_name}_{st.session_state.project_name}.json"
+    file_basename = f"{st.session_state.user_name}_{st.session_state.project_name}{PROJEKT_ENDUNG}"
     file_path = os.path.join(PROJECTS_DIR, file_basename)
 
-    if st.button("Projekt Speichern"):
+    def projekt_laden_callback(quelle, anzeigename):
+        # Läuft vor dem nächsten Skriptdurchlauf, daher dürfen auch bereits angelegte Widgets gesetzt werden
         try:
-            # Manuell alle relevanten session_state keys sammeln
-            params_to_save = {k: st.session_state[k] for k in default_werte.keys() if k in st.session_state}
-            # Füge dynamisch generierte Keys hinzu, falls nötig (z.B. u_aussenwand)
-            # Dies ist eine Vereinfachung; eine robustere Methode wäre, alle Keys beim Widget-Erstellen zu erfassen
-            for u_key in ["u_aussenwand_gedaemmt", "u_aussenwand_ungedaemmt", "u_dach", "u_boden", "u_fenster"]:
-                 if u_key in st.session_state: params_to_save[u_key] = st.session_state[u_key]
+            parameter, arrays = lade_projekt(quelle() if callable(quelle) else quelle)
+            ignoriert = uebernehme_projekt(parameter, arrays)
+            st.session_state.projekt_meldung = ("success", f"Projekt '{anzeigename}' geladen.")
+            if ignoriert:
+                st.session_state.projekt_meldung = ("warning", f"Projekt '{anzeigename}' geladen; unbekannte Einträge ignoriert: {', '.join(map(str, ignoriert))}")
+        except Exception as e:
+            st.session_state.projekt_meldung = ("error", f"Fehler beim Laden der Datei: {e}")
 
+    def projekt_hochladen_callback():
+        hochgeladen = st.session_state.project_upload
+        if hochgeladen is not None:
+            projekt_laden_callback(hochgeladen.getvalue, hochgeladen.name)
 
-            with open(file_path, 'w') as f:
-                json.dump(params_to_save, f, indent=2)
+    if st.button("Projekt Speichern"):
+        try:
+            params_to_save = {k: st.session_state[k] for k in default_werte.keys() if k in st.session_state and k not in PROJEKT_TABELLEN}
+            # Manuell überschriebene U-Werte markieren, sonst setzt die Vorschlagslogik sie beim Laden zurück
+            params_to_save.update({k: True for k in st.session_state if str(k).endswith("_manually_set")})
+            # Zonentabelle inkl. Änderungen aus dem Tabelleneditor; noch nicht gelesene Tabellen aus dem geladenen Projekt übernehmen
+            zonen_zeilen = st.session_state.get("zonen_tabelle_bearbeitet") or st.session_state.zonen_tabelle
+            if not zonen_zeilen and "zonen_tabelle" in st.session_state.get("projekt_arrays", ProjektArrays()):
+                zonen_zeilen = st.session_state.projekt_arrays.tabelle("zonen_tabelle")
+            if any(st.session_state.get("zonen_editor", {}).get(k) for k in ("edited_rows", "added_rows", "deleted_rows")):
+                params_to_save["zonen_tabelle_manuell"] = True
+            projekt_bytes = projekt_zu_bytes(params_to_save, {"zonen_tabelle": zonen_zeilen} if zonen_zeilen else {})
+            speichere_atomar(file_path, projekt_bytes)
             st.success(f"Projekt '{file_basename}' erfolgreich gespeichert!")
+            st.download_button("Projektdatei herunterladen", data=projekt_bytes, file_name=file_basename, mime="application/zip")
         except Exception as e:
             st.error(f"Fehler beim Speichern: {e}")
 
-    # Laden: Liste existierender Projektdateien oder Upload
-    # Vereinfachung: Nur Upload
-    uploaded_file = st.file_uploader("Projekt Laden (.json)", type="json", key="project_upload")
-    if uploaded_file is not None:
-        try:
-            loaded_data = json.load(uploaded_file)
-            for key, value in loaded_data.items(): # Parameter in session_state laden
-                st.session_state[key] = value
-            # Extra Logik um sicherzustellen, dass alle default_werte Keys im session_state sind, falls Datei alt
-            for default_key, default_val in default_werte.items():
-                if default_key not in st.session_state:
-                    st.session_state[default_key] = default_val
-            
-            st.success(f"Projekt '{uploaded_file.name}' geladen! Bitte Seite ggf. neu laden (F5) oder warten bis Widgets aktualisiert sind.")
-            # st.experimental_rerun() # Löst automatischen Rerun aus
-        except Exception as e:
-            st.error(f"Fehler beim Laden der Datei: {e}")
+    # Laden: gespeicherte Projekte im Projektordner oder Upload (auch alte .json-Dateien)
+    gespeicherte_projekte = sorted(f for f in os.listdir(PROJECTS_DIR) if f.endswith((PROJEKT_ENDUNG, ".json")) and not f.endswith(".erg.json"))
+    if gespeicherte_projekte:
+        projekt_auswahl = st.selectbox("Gespeichertes Projekt", gespeicherte_projekte, key="projekt_auswahl")
+        st.button("Projekt Laden", on_click=projekt_laden_callback,
+                  args=(os.path.join(PROJECTS_DIR, projekt_auswahl), projekt_auswahl))
+    st.file_uploader(f"Projekt Laden ({PROJEKT_ENDUNG} oder .json)", type=[PROJEKT_ENDUNG.lstrip("."), "json"], key="project_upload",
+                     on_change=projekt_hochladen_callback)
+    if "projekt_meldung" in st.session_state:
+        meldung_typ, meldung_text = st.session_state.pop("projekt_meldung")
+        {"success": st.success, "warning": st.warning}.get(meldung_typ, st.error)(meldung_text)
 
 
 # --- 1. GLOBALE EINSTELLUNGEN (KOMPAKT) ---
@@ -216,6 +895,8 @@ with st.sidebar.expander("Globale Einstellungen", expanded=True):
     st.slider("Jährl. Preissteigerung Strom (%)", 0.0, 10.0, key="preissteigerung_strom", step=0.1)
     st.slider("Jährl. Preissteigerung Gas (%)", 0.0, 10.0, key="preissteigerung_gas", step=0.1)
     st.slider("Jährl. Preissteigerung Fernwärme (%)", 0.0, 10.0, key="preissteigerung_fernwaerme", step=0.1)
+    st.slider("Kalkulationszinssatz (%)", 0.0, 10.0, key="kalkulationszins", step=0.1,
+              help="Zinssatz für Kapitalwert, Annuität und dynamische Amortisation.")
 
 
 # --- HAUPTBEREICH ---
@@ -291,16 +972,73 @@ with tab1: # Gebäude & Bedarf
         H_T_boden = st.session_state.u_boden * st.session_state.flaeche_boden
         H_T_fenster = st.session_state.u_fenster * st.session_state.flaeche_fenster_gesamt
         H_T_gesamt = H_T_wand + H_T_dach + H_T_boden + H_T_fenster
-        H_L_pauschal_faktor = 0.15
+        H_L_pauschal_faktor = LUEFTUNG_PAUSCHAL_FAKTOR
         H_TR_gesamt_mit_lueftung = H_T_gesamt * (1 + H_L_pauschal_faktor)
 
         st.metric("Spezifischer Transmissionswärmeverlustkoeffizient $H_T$ (ohne Lüftung)", f"{H_T_gesamt:.2f} W/K")
         st.metric("Gesamtwärmeverlustkoeffizient $H_{TR}$ (inkl. pauschaler Lüftung)", f"{H_TR_gesamt_mit_lueftung:.2f} W/K")
 
+    with st.expander("1b. Mehrzonenmodell (Wohneinheiten)", expanded=st.session_state.use_zonenmodell):
+        st.checkbox("Gebäude zonenweise je Wohneinheit berechnen", key="use_zonenmodell",
+                    help="Ersetzt das Einzonenmodell durch eine Zonentabelle mit eigenen Flächen, U-Werten, Belegung und Solltemperaturen je Wohneinheit.")
+        zonenmodell = None
+        if st.session_state.use_zonenmodell:
+            col_z1, col_z2, col_z3 = st.columns(3)
+            with col_z1:
+                st.number_input("Anzahl Wohneinheiten", min_value=1, step=1, key="zonen_anzahl_we")
+            with col_z2:
+                st.number_input("Anzahl Geschosse", min_value=1, step=1, key="zonen_geschosse")
+            with col_z3:
+                st.checkbox("Treppenhaus beheizt", key="zonen_treppenhaus_beheizt")
+            if st.session_state.zonen_treppenhaus_beheizt:
+                st.slider("Anteil der Außenwandfläche am Treppenhaus", 0.0, 0.5, key="zonen_treppenhaus_wandanteil", step=0.01)
+            else:
+                col_z4, col_z5 = st.columns(2)
+                with col_z4:
+                    st.number_input("Trennwandfläche zum unbeheizten Treppenhaus, gesamt (m²)", min_value=0.0, step=10.0, key="zonen_trennwand_flaeche",
+                                    help="Zusätzliche Hüllfläche der Wohnungen gegen das Treppenhaus; 0 = wie Einzonenmodell.")
+                with col_z5:
+                    st.number_input("U-Wert Trennwand Treppenhaus", format="%.2f", key="zonen_trennwand_u")
+
+            if not st.session_state.zonen_tabelle and "zonen_tabelle" in st.session_state.get("projekt_arrays", ProjektArrays()):
+                st.session_state.zonen_tabelle = st.session_state.projekt_arrays.tabelle("zonen_tabelle") # Erst hier aus der Projektdatei lesen
+            u_wand_mittel = (H_T_wand / st.session_state.flaeche_aussenwand_gesamt) if st.session_state.flaeche_aussenwand_gesamt > 0 else st.session_state.u_aussenwand_gedaemmt
+            zonen_eingaben = dict(
+                anzahl_we=st.session_state.zonen_anzahl_we, anzahl_geschosse=st.session_state.zonen_geschosse,
+                treppenhaus_beheizt=st.session_state.zonen_treppenhaus_beheizt,
+                flaechen={"aussenwand": st.session_state.flaeche_aussenwand_gesamt, "dach": st.session_state.flaeche_dach,
+                          "boden": st.session_state.flaeche_boden, "fenster": st.session_state.flaeche_fenster_gesamt},
+                u_werte={"aussenwand": u_wand_mittel, "dach": st.session_state.u_dach,
+                         "boden": st.session_state.u_boden, "fenster": st.session_state.u_fenster},
+                personen_gesamt=st.session_state.anzahl_personen,
+                treppenhaus_wandanteil=st.session_state.zonen_treppenhaus_wandanteil,
+                trennwand_flaeche=st.session_state.zonen_trennwand_flaeche, u_trennwand=st.session_state.zonen_trennwand_u)
+            # Kennung der Eingaben, aus denen die Tabelle erzeugt wurde, um veraltete Tabellen zu erkennen
+            zonen_quelle = json.dumps(zonen_eingaben, sort_keys=True)
+            zonen_editor_aenderungen = any(st.session_state.get("zonen_editor", {}).get(k) for k in ("edited_rows", "added_rows", "deleted_rows"))
+            zonen_manuell = st.session_state.zonen_tabelle_manuell or zonen_editor_aenderungen
+            zonen_veraltet = st.session_state.zonen_tabelle_quelle != zonen_quelle
+            if st.button("Zonentabelle aus Gebäudedaten erzeugen") or not st.session_state.zonen_tabelle or (zonen_veraltet and not zonen_manuell):
+                st.session_state.zonen_tabelle = erzeuge_zonentabelle(**zonen_eingaben)
+                st.session_state.zonen_tabelle_quelle = zonen_quelle
+                st.session_state.zonen_tabelle_manuell = False
+                st.session_state.pop("zonen_editor", None)
+            elif zonen_veraltet:
+                st.warning("Die Gebäudedaten haben sich seit dem Erzeugen der Zonentabelle geändert. Die manuell bearbeitete Tabelle "
+                           "wird unverändert verwendet; \"Zonentabelle aus Gebäudedaten erzeugen\" übernimmt die neuen Werte (Änderungen gehen verloren).")
+            st.caption("Flächen in m², U-Werte in W/m²K, je Einheit der Zone. \"Anzahl\" fasst gleichartige Einheiten zusammen. "
+                       f"Wände gegen unbeheizte Räume werden mit Fx = {FX_UNBEHEIZT} gewichtet.")
+            zonen_df = st.data_editor(pd.DataFrame(st.session_state.zonen_tabelle, columns=list(ZONEN_SPALTEN)),
+                                      key="zonen_editor", num_rows="dynamic", hide_index=True, use_container_width=True)
+            st.session_state.zonen_tabelle_bearbeitet = zonen_df.to_dict("records")
+            zonenmodell = berechne_zonenmodell(zonen_df, REFERENCE_TEMP_PROFILE, st.session_state.energiesparfaktor_allgemein)
+            H_TR_gesamt_mit_lueftung = float(np.sum(zonenmodell["anzahl"] * zonenmodell["H_TR"]))
+            st.metric("Gesamtwärmeverlustkoeffizient $H_{TR}$ (Summe Zonen)", f"{H_TR_gesamt_mit_lueftung:.2f} W/K",
+                      delta=f"{H_TR_gesamt_mit_lueftung - H_T_gesamt * (1 + H_L_pauschal_faktor):+.2f} W/K ggü. Einzonenmodell", delta_color="off")
+
     with st.expander("2. Referenzklima & Heizwärmebedarf", expanded=True):
         # ... (Klimagrafik und Heizwärmebedarfsberechnung wie zuvor) ...
-        fig_temp = px.line(REFERENCE_TEMP_PROFILE, x="Monat", y=["Mitteltemperatur", "Min-Temperatur", "Max-Temperatur"],
-                       labels={"value": "Temperatur (°C)", "variable": "Profil"}, markers=True)
+        fig_temp = temperatur_figur(REFERENCE_TEMP_PROFILE)
         st.plotly_chart(fig_temp, use_container_width=True)
         monatsdaten = REFERENCE_TEMP_PROFILE.copy()
         monatsdaten["HeizbedarfAktiv"] = (monatsdaten["Mitteltemperatur"] < HEIZGRENZE_TEMP) & \
@@ -308,11 +1046,97 @@ with tab1: # Gebäude & Bedarf
         monatsdaten["DeltaT_Heizung"] = np.maximum(0, RAUMTEMPERATUR_SOLL - monatsdaten["Mitteltemperatur"])
         monatsdaten["Heizstunden"] = monatsdaten["TageImMonat"] * 24 * monatsdaten["HeizbedarfAktiv"]
         monatsdaten["Heizwaermebedarf_kWh"] = (H_TR_gesamt_mit_lueftung * monatsdaten["DeltaT_Heizung"] * monatsdaten["Heizstunden"]) / 1000
+        if zonenmodell is not None:
+            monatsdaten["Heizwaermebedarf_kWh"] = np.sum(zonenmodell["anzahl"][:, None] * zonenmodell["heizwaerme_monat"], axis=0)
         Q_H_jahr = monatsdaten["Heizwaermebedarf_kWh"].sum()
         st.metric("Jährlicher Heizwärmebedarf (Gebäude)", f"{Q_H_jahr:,.0f} kWh/a")
         heizbedarf_monatlich_df = monatsdaten[["Monat", "MonatNr", "TageImMonat", "Heizwaermebedarf_kWh"]].copy()
         heizbedarf_monatlich_df.rename(columns={"Heizwaermebedarf_kWh": "Heizung"}, inplace=True)
 
+    with st.expander("2b. Dynamisches Stundenmodell (5R1C)", expanded=st.session_state.use_5r1c):
+        st.checkbox("Heizwärmebedarf stündlich mit thermischer Speichermasse, Gewinnen und Nachtabsenkung simulieren", key="use_5r1c",
+                    help="Vereinfachtes Widerstands-Kapazitäts-Modell nach DIN EN ISO 13790 (5R1C) mit synthetischem Stundenklima "
+                         "aus dem Referenz-Temperaturprofil. Ersetzt den stationären Monatswert.")
+        heizleistung_stuendlich_kW = None
+        heizwaerme_dyn_je_zone_kWh = None # Jahres-Heizwärme je Einheit der Zone (Zonenmodell)
+        sim_5r1c = None
+        if st.session_state.use_5r1c:
+            col_dyn1, col_dyn2, col_dyn3 = st.columns(3)
+            with col_dyn1:
+                if zonenmodell is None:
+                    st.number_input("Beheizte Nutzfläche $A_f$ (m²)", min_value=10.0, step=10.0, key="nutzflaeche")
+                else:
+                    st.metric("Beheizte Nutzfläche $A_f$ (Summe Zonen)",
+                              f"{np.sum(zonenmodell['anzahl'] * zonenmodell['beheizt'] * zonenmodell['nutzflaeche']):,.0f} m²")
+            with col_dyn2:
+                st.selectbox("Bauschwere (wirksame Speichermasse)", list(BAUSCHWERE.keys()), key="bauschwere")
+            with col_dyn3:
+                st.slider("Nachtabsenkung 22-6 Uhr (K)", 0.0, 8.0, key="nachtabsenkung_K", step=0.5)
+
+            # Gebäude bzw. beheizte Zonen als Batch: eine Zeile je Zone, sonst das Gesamtgebäude
+            if zonenmodell is not None:
+                dyn_index = np.flatnonzero(zonenmodell["beheizt"] & (zonenmodell["anzahl"] > 0))
+                dyn_namen = zonen_df["Zone"].astype(str).to_numpy()[dyn_index]
+                dyn_anzahl = zonenmodell["anzahl"][dyn_index]
+                dyn_H_T, dyn_H_T_fenster = zonenmodell["H_T"][dyn_index], zonenmodell["H_T_fenster"][dyn_index]
+                dyn_A_fenster, dyn_soll = zonenmodell["A_fenster"][dyn_index], zonenmodell["soll"][dyn_index]
+                dyn_A_f = zonenmodell["nutzflaeche"][dyn_index]
+                dyn_gewinne_aktiv = zonenmodell["ist_wohneinheit"][dyn_index] # Keine Wohnungs-Gewinne im Treppenhaus
+            else:
+                dyn_namen = np.array(["Gebäude"])
+                dyn_anzahl = np.ones(1)
+                dyn_H_T, dyn_H_T_fenster = np.array([H_T_gesamt]), np.array([H_T_fenster])
+                dyn_A_fenster, dyn_soll = np.array([st.session_state.flaeche_fenster_gesamt]), np.array([RAUMTEMPERATUR_SOLL])
+                dyn_A_f = np.array([st.session_state.nutzflaeche])
+                dyn_gewinne_aktiv = np.ones(1, dtype=bool)
+
+            klima_h = REFERENCE_HOURLY_CLIMATE
+            nacht = ((klima_h["Stunde"] >= 22) | (klima_h["Stunde"] < 6)).to_numpy()
+            interne_gewinne_profil = np.tile(hh_daily_shape * 24, 365) * INTERNE_GEWINNE_W_M2
+            bauschwere_werte = BAUSCHWERE[st.session_state.bauschwere]
+            dyn_H_tr_op = dyn_H_T - dyn_H_T_fenster
+            dyn_H_ve = dyn_H_T * LUEFTUNG_PAUSCHAL_FAKTOR
+            dyn_ungueltig = pruefe_5r1c_parameter(dyn_H_tr_op, dyn_H_ve, dyn_A_f, bauschwere_werte["A_m"] * dyn_A_f)
+            if np.any(dyn_ungueltig):
+                st.error("Stundenmodell für diese Zonen nicht anwendbar (Nutzfläche zu klein im Verhältnis zu den opaken "
+                         f"Wärmeverlusten, H_tr_op ≥ 9,1·A_m, oder Nutzfläche/Hüllfläche 0): {', '.join(dyn_namen[dyn_ungueltig])}. "
+                         "Es wird der stationäre Heizwärmebedarf verwendet.")
+            elif len(dyn_anzahl) > 0:
+                sim_5r1c = simuliere_5r1c_gecacht(
+                    dyn_anzahl,
+                    dyn_H_tr_op, dyn_H_T_fenster, dyn_H_ve, dyn_A_f,
+                    bauschwere_werte["C_m"] * dyn_A_f, bauschwere_werte["A_m"] * dyn_A_f,
+                    klima_h["Temperatur"].to_numpy(),
+                    (dyn_A_f * dyn_gewinne_aktiv)[:, None] * interne_gewinne_profil[None, :],
+                    FENSTER_SOLARFAKTOR * dyn_A_fenster[:, None] * klima_h["Globalstrahlung_W_m2"].to_numpy()[None, :],
+                    dyn_soll[:, None] - st.session_state.nachtabsenkung_K * nacht[None, :],
+                    # Heizleistung auf die Normheizlast begrenzen (realistisches Wiederaufheizen nach Absenkung)
+                    phi_max=dyn_H_T * (1 + LUEFTUNG_PAUSCHAL_FAKTOR) * np.maximum(0, dyn_soll - NORM_AUSSENTEMPERATUR))
+
+        if sim_5r1c is not None:
+            heizleistung_stuendlich_kW = sim_5r1c["heizleistung_gebaeude_W"] / 1000
+            if zonenmodell is not None:
+                heizwaerme_dyn_je_zone_kWh = np.zeros(len(zonenmodell["anzahl"]))
+                heizwaerme_dyn_je_zone_kWh[dyn_index] = sim_5r1c["heizwaerme_kWh"]
+
+            Q_H_jahr_stationaer = Q_H_jahr
+            heizbedarf_monatlich_df["Heizung"] = np.bincount(klima_h["MonatNr"].to_numpy() - 1, heizleistung_stuendlich_kW, minlength=12)
+            Q_H_jahr = heizbedarf_monatlich_df["Heizung"].sum()
+            col_dyn_m1, col_dyn_m2, col_dyn_m3 = st.columns(3)
+            col_dyn_m1.metric("Jährlicher Heizwärmebedarf (dynamisch)", f"{Q_H_jahr:,.0f} kWh/a",
+                              delta=f"{Q_H_jahr - Q_H_jahr_stationaer:,.0f} kWh ggü. stationär", delta_color="off")
+            col_dyn_m2.metric("Max. Heizleistung (Referenzjahr)", f"{heizleistung_stuendlich_kW.max():,.1f} kW")
+            col_dyn_m3.metric("Volllaststunden", f"{Q_H_jahr / max(heizleistung_stuendlich_kW.max(), 1e-9):,.0f} h/a")
+            fenster_tage = st.slider("Detailausschnitt (Tag des Jahres)", 1, 365, (1, 365), key="heizleistung_fenster")
+            tag_stuendlich = 1 + np.arange(len(heizleistung_stuendlich_kW)) / 24
+            fig_heizleistung_dyn = zeitreihen_figur(
+                tag_stuendlich, {"Heizleistung": heizleistung_stuendlich_kW, "Außentemperatur (°C)": klima_h["Temperatur"].to_numpy()},
+                "Heizleistung 5R1C-Modell (stündlich, Min/Max-reduziert)", "Tag des Jahres", "Heizleistung (kW) / Temperatur (°C)",
+                fenster=(fenster_tage[0], fenster_tage[1] + 1))
+            st.plotly_chart(fig_heizleistung_dyn, use_container_width=True)
+            st.caption("Die Auslegungsheizlast für die Kostenberechnung bleibt normbasiert (stationär bei "
+                       f"{NORM_AUSSENTEMPERATUR:.0f} °C); das synthetische Referenzjahr enthält keine Normkälteperiode.")
+
 
 with tab2: # PV & Weitere Verbräuche
     with st.expander("3. PV-Anlage", expanded=True):
@@ -358,21 +1182,26 @@ with tab2: # PV & Weitere Verbräuche
 
     with st.expander("4. Weitere Energieverbräuche", expanded=True):
         st.subheader("Energiebedarf für Brauchwasser")
-        bedarf_ww_person_jahr_basis = 600 # kWh
+        bedarf_ww_person_jahr_basis = WW_BEDARF_PERSON_KWH # kWh
         # Korrigierte Formel für Energiesparfaktor-Auswirkung
         bedarf_ww_jahr_gesamt = st.session_state.anzahl_personen * bedarf_ww_person_jahr_basis * (1 - (st.session_state.energiesparfaktor_allgemein * 0.5))
+        if zonenmodell is not None:
+            bedarf_ww_jahr_gesamt = float(np.sum(zonenmodell["anzahl"] * zonenmodell["ww_jahr"]))
+            st.caption(f"Aus Zonentabelle: {np.sum(zonenmodell['anzahl'] * zonenmodell['personen']):.1f} Personen in {zonenmodell['anzahl_wohneinheiten']:.0f} Wohneinheiten.")
         bedarf_ww_monatlich_wert = bedarf_ww_jahr_gesamt / 12
         st.metric("Jährlicher Energiebedarf Brauchwasser", f"{bedarf_ww_jahr_gesamt:,.0f} kWh/a")
 
         st.subheader("Energiebedarf Haushaltsstrom (ohne Heizung/WW-Erzeugung)")
-        bedarf_strom_person_jahr_basis_kWh = 1000 # kWh/Person (reiner Verbrauchsteil)
-        grundlast_pro_wohneinheit_kWh = 800 # kWh/WE (z.B. für Kühlschrank etc. einer WE)
+        bedarf_strom_person_jahr_basis_kWh = HAUSHALTSSTROM_PERSON_KWH # kWh/Person (reiner Verbrauchsteil)
+        grundlast_pro_wohneinheit_kWh = HAUSHALTSSTROM_GRUNDLAST_WE_KWH # kWh/WE (z.B. für Kühlschrank etc. einer WE)
         anzahl_haushalte_approx = max(1, round(st.session_state.anzahl_personen / 2.5)) # Grobe Schätzung Anzahl Wohneinheiten
         
         # Berechnung Haushaltsstrom
         bedarf_strom_jahr_berechnet = (st.session_state.anzahl_personen * bedarf_strom_person_jahr_basis_kWh + \
                                     anzahl_haushalte_approx * grundlast_pro_wohneinheit_kWh) * \
                                     (1 - st.session_state.energiesparfaktor_allgemein)
+        if zonenmodell is not None:
+            bedarf_strom_jahr_berechnet = float(np.sum(zonenmodell["anzahl"] * zonenmodell["haushaltsstrom_jahr"]))
         
         st.markdown(f"Berechneter Basis-Haushaltsstrombedarf (vor manueller Korrektur): **{bedarf_strom_jahr_berechnet:,.0f} kWh/a**")
         st.number_input("Manuelle Angabe Jahres-Haushaltsstrombedarf (kWh/a, 0 = Berechnung nutzen)",
@@ -421,8 +1250,10 @@ with tab3: # Systemvergleich & Kosten
                        "inst_kosten_fix": 8000, "inst_kosten_leistung": 300, "wartung_pa": 150, # leicht erhöht
                        "invest_adj_key": "invest_adj_fw"}
     }
-    delta_T_norm_auslegung = RAUMTEMPERATUR_SOLL - (-14)
+    delta_T_norm_auslegung = RAUMTEMPERATUR_SOLL - NORM_AUSSENTEMPERATUR
     heizlast_kW = (H_TR_gesamt_mit_lueftung * delta_T_norm_auslegung) / 1000
+    if zonenmodell is not None:
+        heizlast_kW = float(np.sum(zonenmodell["anzahl"] * zonenmodell["heizlast_kW"]))
 
     # --- Berechnungsfunktion (bleibt im Kern ähnlich, aber Investitionskosten PV ausgelagert) ---
     def berechne_system_details_v2(system_name, Q_H_monat_df_param, Q_WW_monat_param, E_HH_monat_param_array,
@@ -517,6 +1348,10 @@ with tab3: # Systemvergleich & Kosten
         if params["brennstoff"] == "Gas": kosten_brennstoff_heizsystem = np.sum(monatliche_brennstoff_heizsystem) * preise_param["gas"]
         elif params["brennstoff"] == "Fernwärme": kosten_brennstoff_heizsystem = np.sum(monatliche_brennstoff_heizsystem) * preise_param["fernwaerme"]
         laufende_energiekosten_jahr = kosten_strom_bezug + kosten_brennstoff_heizsystem - erloes_einspeisung
+        # Netzbezug monatlich im Verhältnis des Bedarfs auf Heizsystem und Haushalt aufteilen (für die Kostenumlage)
+        anteil_heizsystem_netz = np.divide(monatliche_strom_fuer_heizsystem, monatlicher_strombedarf_gesamt_ohne_pv,
+                                           out=np.zeros(12), where=monatlicher_strombedarf_gesamt_ohne_pv > 0)
+        kosten_strom_heizsystem = np.sum(netzbezug_strom_monatlich * anteil_heizsystem_netz) * preise_param["strom"]
         wartungskosten_jahr = params["wartung_pa"]
         gesamte_laufende_kosten_jahr = laufende_energiekosten_jahr + wartungskosten_jahr
 
@@ -530,6 +1365,10 @@ with tab3: # Systemvergleich & Kosten
             "laufende_energiekosten_jahr": laufende_energiekosten_jahr,
             "wartungskosten_jahr": wartungskosten_jahr,
             "gesamte_laufende_kosten_jahr": gesamte_laufende_kosten_jahr,
+            # Kostenkomponenten für die Umlage; Summe = gesamte_laufende_kosten_jahr
+            "kosten_waerme_jahr": kosten_brennstoff_heizsystem + kosten_strom_heizsystem,
+            "kosten_haushaltsstrom_jahr": kosten_strom_bezug - kosten_strom_heizsystem,
+            "erloes_einspeisung_jahr": erloes_einspeisung,
             "jahresverbrauch_strom_netz": np.sum(netzbezug_strom_monatlich),
             "jahresverbrauch_gas": np.sum(monatliche_brennstoff_heizsystem) if params["brennstoff"] == "Gas" else 0,
             "jahresverbrauch_fernwaerme": np.sum(monatliche_brennstoff_heizsystem) if params["brennstoff"] == "Fernwärme" else 0,
@@ -611,60 +1450,45 @@ with tab3: # Systemvergleich & Kosten
         "Strombedarf Heizsystem": vis_df_monthly_plot["Strom_Heizsystem"],
         "PV Erzeugung": vis_df_monthly_plot["PV_Erzeugung"] * -1 # Negativ für Darstellung
     })
-    fig_energy_balance_monthly_display = go.Figure()
-    for col_name_plot in ["Heizwärmebedarf", "Warmwasserbedarf", "Haushaltsstrombedarf", "Strombedarf Heizsystem", "PV Erzeugung"]:
-        fig_energy_balance_monthly_display.add_trace(go.Bar(x=plot_data_monthly_fig["Monat"], y=plot_data_monthly_fig[col_name_plot], name=col_name_plot))
-    fig_energy_balance_monthly_display.update_layout(barmode='relative', title_text='Monatliche Energieflüsse (Bedarfe vs. PV Erzeugung)',
-                                     xaxis_title="Monat", yaxis_title="Energie (kWh)")
+    fig_energy_balance_monthly_display = energiebilanz_figur(plot_data_monthly_fig)
     st.plotly_chart(fig_energy_balance_monthly_display, use_container_width=True)
 
 
     # --- 15-JAHRES-PROGNOSE ---
     st.subheader(f"{st.session_state.prognose_jahre}-Jahres-Kostenprognose")
     # ... (Prognose-Logik wie zuvor, aber Gesamte Investitionskosten richtig berücksichtigen) ...
-    prognose_daten_liste_final = []
-    ps_strom_val = st.session_state.preissteigerung_strom / 100
-    ps_gas_val = st.session_state.preissteigerung_gas / 100
-    ps_fw_val = st.session_state.preissteigerung_fernwaerme / 100
-
-    for res_system_prog in results_all_systems_details:
-        system_name_prog = res_system_prog["name"]
-        kum_kosten_prog = res_system_prog['installationskosten_system_anteil'] + (installationskosten_pv_final if st.session_state.use_pv else 0)
-        
-        current_strompreis_prog = st.session_state.strompreis
-        current_gaspreis_prog = st.session_state.gaspreis
-        current_fernwaermepreis_prog = st.session_state.fernwaermepreis
-        current_einspeiseverguetung_prog = st.session_state.einspeiseverguetung
-
-        for jahr_prog in range(1, int(st.session_state.prognose_jahre) + 1):
-            # ... (Berechnung laufende Kosten pro Jahr mit Preissteigerung) ...
-            # (Code identisch zur vorherigen Prognoseberechnung, hier gekürzt)
-            aktuelle_preise_prognose_jahr_val = {
-                "strom": current_strompreis_prog, "gas": current_gaspreis_prog,
-                "fernwaerme": current_fernwaermepreis_prog, "einspeisung": current_einspeiseverguetung_prog
-            }
-            kosten_strom_bezug_prognose_val = res_system_prog["jahresverbrauch_strom_netz"] * aktuelle_preise_prognose_jahr_val["strom"]
-            erloes_einspeisung_prognose_val = res_system_prog["pv_einspeisung_jahr"] * aktuelle_preise_prognose_jahr_val["einspeisung"]
-            kosten_brennstoff_prognose_val = 0
-            if res_system_prog["jahresverbrauch_gas"] > 0: kosten_brennstoff_prognose_val = res_system_prog["jahresverbrauch_gas"] * aktuelle_preise_prognose_jahr_val["gas"]
-            elif res_system_prog["jahresverbrauch_fernwaerme"] > 0: kosten_brennstoff_prognose_val = res_system_prog["jahresverbrauch_fernwaerme"] * aktuelle_preise_prognose_jahr_val["fernwaerme"]
-            laufende_energiekosten_prognose_jahr_val = kosten_strom_bezug_prognose_val + kosten_brennstoff_prognose_val - erloes_einspeisung_prognose_val
-            gesamte_laufende_kosten_prognose_jahr_val = laufende_energiekosten_prognose_jahr_val + res_system_prog["wartungskosten_jahr"]
-            
-            kum_kosten_prog += gesamte_laufende_kosten_prognose_jahr_val
-            prognose_daten_liste_final.append({
-                "System": system_name_prog, "Jahr": jahr_prog,
-                "Laufende Kosten": gesamte_laufende_kosten_prognose_jahr_val,
-                "Kumulierte Kosten": kum_kosten_prog
-            })
-            current_strompreis_prog *= (1 + ps_strom_val)
-            current_gaspreis_prog *= (1 + ps_gas_val)
-            current_fernwaermepreis_prog *= (1 + ps_fw_val)
-
-    prognose_df_output = pd.DataFrame(prognose_daten_liste_final)
+    preissteigerungen_dict = {"strom": st.session_state.preissteigerung_strom / 100,
+                              "gas": st.session_state.preissteigerung_gas / 100,
+                              "fernwaerme": st.session_state.preissteigerung_fernwaerme / 100}
+    prognose_jahre_int = int(st.session_state.prognose_jahre)
+    system_namen_arr = np.array([res["name"] for res in results_all_systems_details])
+
+    def kennwerte_als_arrays(results_liste):
+        return {k: np.array([res[k] for res in results_liste], dtype=float)
+                for k in ["jahresverbrauch_strom_netz", "pv_einspeisung_jahr", "jahresverbrauch_gas",
+                          "jahresverbrauch_fernwaerme", "wartungskosten_jahr"]}
+
+    def kostenverlauf_fuer(results_liste):
+        kw = kennwerte_als_arrays(results_liste)
+        return berechne_laufende_kosten_verlauf(
+            kw["jahresverbrauch_strom_netz"], kw["pv_einspeisung_jahr"], kw["jahresverbrauch_gas"],
+            kw["jahresverbrauch_fernwaerme"], kw["wartungskosten_jahr"],
+            preis_dict, preissteigerungen_dict, prognose_jahre_int)
+
+    # Laufende Kosten je System und Jahr (System x Jahr) in einem Schritt
+    laufende_kosten_verlauf = kostenverlauf_fuer(results_all_systems_details)
+    investition_systeme = np.array([res['installationskosten_system_anteil'] for res in results_all_systems_details], dtype=float) + \
+                          (installationskosten_pv_final if st.session_state.use_pv else 0)
+    kumulierte_kosten_verlauf = investition_systeme[:, None] + np.cumsum(laufende_kosten_verlauf, axis=1)
+
+    prognose_df_output = pd.DataFrame({
+        "System": np.repeat(system_namen_arr, prognose_jahre_int),
+        "Jahr": np.tile(np.arange(1, prognose_jahre_int + 1), len(system_namen_arr)),
+        "Laufende Kosten": laufende_kosten_verlauf.ravel(),
+        "Kumulierte Kosten": kumulierte_kosten_verlauf.ravel(),
+    })
     if not prognose_df_output.empty:
-        fig_prognose_output = px.line(prognose_df_output, x="Jahr", y="Kumulierte Kosten", color="System",
-                               title=f"Kumulierte Gesamtkosten über {st.session_state.prognose_jahre} Jahre", markers=True)
+        fig_prognose_output = prognose_figur(prognose_df_output, st.session_state.prognose_jahre)
         st.plotly_chart(fig_prognose_output, use_container_width=True)
         # ... (Empfehlungstext wie zuvor) ...
         beste_option_ende_df_val = prognose_df_output[prognose_df_output["Jahr"] == int(st.session_state.prognose_jahre)]
@@ -674,6 +1498,147 @@ with tab3: # Systemvergleich & Kosten
                        f"voraussichtlich die kostengünstigste Option dar, mit kumulierten Kosten von "
                        f"{beste_option_ende_val['Kumulierte Kosten']:,.0f} €.")
 
+    # --- DYNAMISCHE WIRTSCHAFTLICHKEIT ---
+    st.subheader("Dynamische Wirtschaftlichkeit (Kapitalwert, Annuität, Amortisation)")
+    st.selectbox("Referenzsystem für die Amortisation", heizsystem_optionen_alle, key="referenzsystem")
+    zinssatz_val = st.session_state.kalkulationszins / 100
+    referenz_index_val = heizsystem_optionen_alle.index(st.session_state.referenzsystem)
+    finanzkennzahlen = berechne_finanzkennzahlen(investition_systeme, laufende_kosten_verlauf, zinssatz_val,
+                                                 referenz_index=referenz_index_val)
+
+    # IRR der PV-/Speicherinvestition: Rückflüsse = Kostenersparnis gegenüber dem gleichen System ohne PV
+    irr_pv_systeme = np.full(len(results_all_systems_details), np.nan)
+    if st.session_state.use_pv and installationskosten_pv_final > 0:
+        results_ohne_pv = [
+            berechne_system_details_v2(
+                system_name_iter, heizbedarf_monatlich_df, bedarf_ww_monatlich_wert,
+                energiebilanz_df_basis["Haushaltsstrom"].values, pd.Series([0.0]*12, index=range(1,13)),
+                st.session_state.pv_nutzungs_strategie, False, 0.0, 1.0, preis_dict, heizlast_kW)
+            for system_name_iter in heizsystem_optionen_alle
+        ]
+        rueckfluesse_pv = kostenverlauf_fuer(results_ohne_pv) - laufende_kosten_verlauf
+        irr_pv_systeme = interner_zinsfuss(installationskosten_pv_final, rueckfluesse_pv)
+
+    finanz_df_output = pd.DataFrame({
+        "System": system_namen_arr,
+        "Investition (€)": investition_systeme,
+        "Barwert Gesamtkosten (€)": finanzkennzahlen["kapitalwert_kosten"],
+        "Annuität (€/a)": finanzkennzahlen["annuitaet"],
+        f"Amortisation ggü. {st.session_state.referenzsystem} (Jahr)": finanzkennzahlen["amortisation_jahr"],
+        "IRR PV/Speicher (%)": irr_pv_systeme * 100,
+    })
+    st.dataframe(finanz_df_output.style.format({
+        "Investition (€)": "{:,.0f}", "Barwert Gesamtkosten (€)": "{:,.0f}", "Annuität (€/a)": "{:,.0f}",
+        f"Amortisation ggü. {st.session_state.referenzsystem} (Jahr)": "{:.0f}", "IRR PV/Speicher (%)": "{:.1f}",
+    }, na_rep="–"), hide_index=True, use_container_width=True)
+    st.caption(f"Kalkulationszinssatz {st.session_state.kalkulationszins:.1f} %, Betrachtungszeitraum {prognose_jahre_int} Jahre. "
+               "Amortisation: erstes Jahr, ab dem die kumulierten diskontierten Kosten dauerhaft nicht über denen des Referenzsystems liegen "
+               "(Jahr 0 = bereits bei der Investition günstiger). IRR: interner Zinsfuß der PV-/Speicherinvestition aus der Ersparnis gegenüber dem gleichen System ohne PV.")
+
+    # --- KOSTENAUFTEILUNG JE WOHNEINHEIT ---
+    if zonenmodell is not None:
+        st.subheader("Kostenaufteilung je Wohneinheit")
+        system_umlage_wahl = st.selectbox("System für die Kostenaufteilung", heizsystem_optionen_alle, key="umlage_system")
+        res_umlage = results_all_systems_details[heizsystem_optionen_alle.index(system_umlage_wahl)]
+        # Manuelle Korrektur des Haushaltsstroms anteilig auf die Einheiten übertragen
+        faktor_hh_umlage = bedarf_strom_jahr_final / bedarf_strom_jahr_berechnet if bedarf_strom_jahr_berechnet > 0 else 1.0
+        # Heizwärme aus derselben Rechnung wie der abgerechnete Gebäudebedarf (5R1C, falls aktiv)
+        heizwaerme_je_einheit = (heizwaerme_dyn_je_zone_kWh if heizwaerme_dyn_je_zone_kWh is not None
+                                 else zonenmodell["heizwaerme_monat"].sum(axis=1))
+        haushaltsstrom_je_einheit = zonenmodell["haushaltsstrom_jahr"] * faktor_hh_umlage
+        anzahl_z = zonenmodell["anzahl"]
+        wohneinheit = zonenmodell["ist_wohneinheit"] & (anzahl_z > 0)
+        flaeche_we = zonenmodell["nutzflaeche"] * wohneinheit
+        if np.sum(anzahl_z * flaeche_we) <= 0:
+            st.info("Keine Wohneinheiten mit Nutzfläche in der Zonentabelle – Kostenaufteilung nicht möglich.")
+        else:
+            def verteile(betrag, schluessel):
+                """Betrag (€/a) nach Schlüssel je Einheit verteilen; ohne Schlüsselsumme nach Wohnfläche."""
+                summe = np.sum(anzahl_z * schluessel)
+                if summe <= 0:
+                    schluessel, summe = flaeche_we, np.sum(anzahl_z * flaeche_we)
+                return betrag * schluessel / summe
+
+            # Energiekomponenten verursachergerecht je Zone, gemeinsame Kosten nach Wohnfläche
+            waerme_je_einheit = heizwaerme_je_einheit + zonenmodell["ww_jahr"]
+            kosten_waerme = verteile(res_umlage["kosten_waerme_jahr"], waerme_je_einheit)
+            kosten_hh = verteile(res_umlage["kosten_haushaltsstrom_jahr"], haushaltsstrom_je_einheit)
+            kosten_gemeinschaft_zonen = np.sum((anzahl_z * (kosten_waerme + kosten_hh))[~wohneinheit])
+            kosten_allgemein = verteile(res_umlage["wartungskosten_jahr"] - res_umlage["erloes_einspeisung_jahr"]
+                                        + kosten_gemeinschaft_zonen, flaeche_we)
+            kosten_gesamt = (kosten_waerme + kosten_hh) * wohneinheit + kosten_allgemein
+            umlage_df = pd.DataFrame({
+                "Zone": zonen_df["Zone"].to_numpy(), "Anzahl": anzahl_z, "Nutzfläche (m²)": zonenmodell["nutzflaeche"],
+                "Heizwärme (kWh/a)": heizwaerme_je_einheit, "Warmwasser (kWh/a)": zonenmodell["ww_jahr"],
+                "Haushaltsstrom (kWh/a)": haushaltsstrom_je_einheit,
+                "Heizung + WW (€/a)": kosten_waerme, "Haushaltsstrom (€/a)": kosten_hh,
+                "Allgemein (€/a)": kosten_allgemein, "Laufende Kosten (€/a)": kosten_gesamt,
+            })[wohneinheit]
+            st.dataframe(umlage_df.style.format({
+                "Nutzfläche (m²)": "{:,.1f}", "Heizwärme (kWh/a)": "{:,.0f}", "Warmwasser (kWh/a)": "{:,.0f}",
+                "Haushaltsstrom (kWh/a)": "{:,.0f}", "Heizung + WW (€/a)": "{:,.0f}", "Haushaltsstrom (€/a)": "{:,.0f}",
+                "Allgemein (€/a)": "{:,.0f}", "Laufende Kosten (€/a)": "{:,.0f}",
+            }), hide_index=True, use_container_width=True)
+            st.caption("Werte je Wohneinheit der Zone (Jahr 1). Brennstoff bzw. Heizstrom nach Heizwärme + Warmwasser, "
+                       "Haushalts-Netzstrom nach Haushaltsstrombedarf; Wartung, Einspeiseerlöse und die Kosten gemeinsam "
+                       "genutzter Zonen (z.B. beheiztes Treppenhaus) nach Nutzfläche. Summe über alle Einheiten: "
+                       f"{np.sum(umlage_df['Anzahl'] * umlage_df['Laufende Kosten (€/a)']):,.0f} € = laufende Kosten des Systems.")
+
+    # --- ERGEBNISSPEICHER ---
+    with st.expander("Ergebnisspeicher (Varianten & Portfolios)", expanded=False):
+        ergebnis_basis_pfad = os.path.join(PROJECTS_DIR, f"{st.session_state.user_name}_{st.session_state.project_name}_ergebnisse")
+        try:
+            ergebnis_speicher = ErgebnisSpeicher(ergebnis_basis_pfad, systeme=heizsystem_optionen_alle)
+        except ValueError as e:
+            st.error(str(e))
+            ergebnis_speicher = None
+
+        if ergebnis_speicher is not None:
+            system_namen_speicher = ergebnis_speicher.meta["systeme"]
+            if st.button("Aktuelle Berechnung als Variante ablegen"):
+                ergebnis_speicher.anhaengen(ergebnisse_zu_zeilen(
+                    results_all_systems_details, investition_systeme, finanzkennzahlen,
+                    szenario_id=ergebnis_speicher.naechste_szenario_id()))
+                st.success("Variante im Ergebnisspeicher abgelegt.")
+
+            anzahl_zeilen_speicher = len(ergebnis_speicher)
+            st.caption(f"{anzahl_zeilen_speicher:,} Zeilen (Gebäude x System x Szenario) in '{ergebnis_speicher.daten_pfad}'.")
+            if anzahl_zeilen_speicher > 0:
+                sortierfelder = ["annuitaet", "kapitalwert_kosten", "investition", "laufende_kosten_jahr", "strom_netz_kWh", "szenario_id"]
+                col_es1, col_es2, col_es3, col_es4 = st.columns(4)
+                with col_es1:
+                    sortierfeld_wahl = st.selectbox("Sortieren nach", sortierfelder, key="ergebnis_sortierung")
+                with col_es2:
+                    absteigend_wahl = st.checkbox("Absteigend", key="ergebnis_absteigend")
+                with col_es3:
+                    system_filter_wahl = st.selectbox("System", ["Alle"] + system_namen_speicher, key="ergebnis_systemfilter")
+                with col_es4:
+                    seitengroesse = 50
+                    seite_wahl = st.number_input("Seite", min_value=1, step=1, key="ergebnis_seite")
+
+                filter_speicher = {}
+                if system_filter_wahl != "Alle":
+                    system_id_wahl = system_namen_speicher.index(system_filter_wahl)
+                    filter_speicher["system_id"] = (system_id_wahl, system_id_wahl)
+                treffer_anzahl, seite_zeilen = ergebnis_speicher.abfrage(
+                    filter_speicher, sortieren_nach=sortierfeld_wahl, absteigend=absteigend_wahl,
+                    offset=(int(seite_wahl) - 1) * seitengroesse, limit=seitengroesse)
+                st.caption(f"{treffer_anzahl:,} Treffer, Seite {int(seite_wahl)} von {max(1, -(-treffer_anzahl // seitengroesse))}.")
+                skalare_felder = [feld for feld in ERGEBNIS_DTYPE.names if ERGEBNIS_DTYPE[feld].shape == ()]
+                seite_df = pd.DataFrame({feld: seite_zeilen[feld] for feld in skalare_felder})
+                seite_df.insert(3, "System", [system_namen_speicher[i] if 0 <= i < len(system_namen_speicher) else str(i) for i in seite_df["system_id"]])
+                st.dataframe(seite_df, hide_index=True, use_container_width=True)
+
+                stichprobe_speicher = ergebnis_speicher.stichprobe(["investition", "annuitaet", "system_id"])
+                fig_ergebnis_stichprobe = px.scatter(
+                    pd.DataFrame({"Investition (€)": stichprobe_speicher["investition"],
+                                  "Annuität (€/a)": stichprobe_speicher["annuitaet"],
+                                  "System": [system_namen_speicher[i] if 0 <= i < len(system_namen_speicher) else str(i)
+                                             for i in stichprobe_speicher["system_id"]]}),
+                    x="Investition (€)", y="Annuität (€/a)", color="System", render_mode="webgl",
+                    title="Investition vs. Annuität (ausgedünnte Stichprobe aller Varianten)")
+                st.plotly_chart(fig_ergebnis_stichprobe, use_container_width=True)
+
 
 with tab4: # Tagesprofil & Export
     st.header("Tagesprofil & PDF-Export")
@@ -697,8 +1662,14 @@ with tab4: # Tagesprofil & Export
     tagesprofil_df_display["PV_Erzeugung_kWh"] = pv_daily_shape * pv_tag_avg_display
     tagesprofil_df_display["Haushaltsstrom_kWh"] = hh_daily_shape * hh_tag_avg_display
     tagesprofil_df_display["Warmwasser_kWh"] = dhw_daily_shape * dhw_tag_avg_display
-    tagesprofil_df_display["Heizung_Energetisch_kWh"] = heating_daily_shape * heiz_tag_avg_display
-    tagesprofil_df_display["Strom_Heizsystem_kWh"] = heating_daily_shape * heizsystem_strom_tag_avg_display # Annahme: Heizprofil = Stromprofil WP
+    heizprofil_tag_display = heating_daily_shape
+    if heizleistung_stuendlich_kW is not None: # Tagesgang aus der Stundensimulation des gewählten Monats
+        heizleistung_monat_display = heizleistung_stuendlich_kW[REFERENCE_HOURLY_CLIMATE["MonatNr"].to_numpy() == idx_monat_display + 1]
+        heizprofil_monat_display = heizleistung_monat_display.reshape(-1, 24).mean(axis=0)
+        if heizprofil_monat_display.sum() > 0:
+            heizprofil_tag_display = heizprofil_monat_display / heizprofil_monat_display.sum()
+    tagesprofil_df_display["Heizung_Energetisch_kWh"] = heizprofil_tag_display * heiz_tag_avg_display
+    tagesprofil_df_display["Strom_Heizsystem_kWh"] = heizprofil_tag_display * heizsystem_strom_tag_avg_display # Annahme: Heizprofil = Stromprofil WP
 
     tagesprofil_df_display["Gesamtstrombedarf_kWh"] = tagesprofil_df_display["Haushaltsstrom_kWh"] + tagesprofil_df_display["Strom_Heizsystem_kWh"]
     tagesprofil_df_display["PV_Direktverbrauch_kWh"] = np.minimum(tagesprofil_df_display["PV_Erzeugung_kWh"], tagesprofil_df_display["Gesamtstrombedarf_kWh"])
@@ -761,7 +1732,7 @@ with tab4: # Tagesprofil & Export
 
         # Kapitel 4: Wirtschaftlichkeitsübersicht
         pdf.chapter_title("4. Wirtschaftlichkeitsübersicht (Jahr 1)")
-        for res_pdf in results_all_systems_details:
+        for idx_pdf, res_pdf in enumerate(results_all_systems_details):
             pdf.set_font('Arial', 'B', 10)
             pdf.cell(0, 7, res_pdf['name'], 0, 1)
             pdf.set_font('Arial', '', 10)
@@ -770,6 +1741,8 @@ with tab4: # Tagesprofil & Export
                 "Investition (mit PV-Anteil)": f"{invest_sys_pdf:,.0f} EUR",
                 "Laufende Energiekosten/Jahr": f"{res_pdf['laufende_energiekosten_jahr']:,.0f} EUR",
                 "Gesamte laufende Kosten/Jahr": f"{res_pdf['gesamte_laufende_kosten_jahr']:,.0f} EUR",
+                "Barwert Gesamtkosten": f"{finanzkennzahlen['kapitalwert_kosten'][idx_pdf]:,.0f} EUR",
+                "Annuität": f"{finanzkennzahlen['annuitaet'][idx_pdf]:,.0f} EUR/a",
             }
             pdf.chapter_body(sys_body)
         